@@ -1,57 +1,252 @@
 #!/usr/bin/env python3
 """
 Script to collect RIPE RRC04 update packets for a specified time period
-and convert them to CSV format using bgpdump with proper parsing.
+and convert them to CSV format using bgpdump with proper parsing
+(or pybgpkit, when installed).
 """
 
 import os
+import io
 import gzip
+import json
 import shutil
 import subprocess
+import tempfile
 import csv
+import queue
+import threading
+import concurrent.futures
+from functools import lru_cache
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from urllib.request import urlopen
 from pathlib import Path
 
+import requests
+from requests.adapters import HTTPAdapter
+
+# Optional: pybgpkit parses MRT files (including .gz) natively, without bgpdump
+try:
+    import bgpkit
+    HAS_BGPKIT = True
+except ImportError:
+    HAS_BGPKIT = False
+
 # Configuration
 BASE_URL = "https://data.ris.ripe.net/rrc04/2025.11"
 RIPE_DIR = "./RIPE"
 OUTPUT_DIR = os.path.join(RIPE_DIR, "mrt_files")
-CSV_OUTPUT = os.path.join(RIPE_DIR, "rrc04_20251117_updates.csv")
-TEMP_DIR = os.path.join(RIPE_DIR, "temp_mrt")
+# Remote size/ETag/Last-Modified of downloaded files, used to detect partial files on reruns
+MANIFEST_PATH = os.path.join(OUTPUT_DIR, ".manifest.json")
+# Gzip the output CSV while it is written (pigz if installed, else gzip)
+COMPRESS_CSV = True
+CSV_OUTPUT = os.path.join(RIPE_DIR, "rrc04_20251117_updates.csv" + (".gz" if COMPRESS_CSV else ""))
+
+# Parallel downloads share one pooled HTTPS session (keep-alive + TLS reuse)
+DOWNLOAD_WORKERS = 16
+DOWNLOAD_CHUNK = 1 << 20  # copy size when streaming a response body to disk
+PARSE_WORKERS = os.cpu_count() or 1
+QUEUE_SIZE = 8  # bounded hand-off between stages for backpressure
+PARSE_AHEAD = 2 * PARSE_WORKERS  # files parsed ahead of the CSV writer (caps spooled rows)
+RECORD_BATCH = 10000  # parsed records per hand-off to the writer
+BGPDUMP_BUFSIZE = 1 << 20
+CSV_BUFSIZE = 1 << 20  # fewer, larger writes for the output CSV
+
+# Inflate with pigz in front of bgpdump when installed, otherwise bgpdump reads the .gz itself
+PIGZ = shutil.which("pigz")
+PIGZ_THREADS = 4
+
+# awk program turning bgpdump -m lines into CSV rows (same quoting and
+# \r\n line endings as csv.writer); per-file counts follow as a final
+# AWK_COUNTS_PREFIX line on stdout
+AWK_PROGRAM = r'''
+function q(s) {
+    if (s ~ /[,"\r]/) { gsub(/"/, "\"\"", s); return "\"" s "\"" }
+    return s
+}
+BEGIN { FS = "|"; OFS = ","; ORS = "\r\n" }
+$1 == "BGP4MP" && NF >= 6 && $2 ~ /^[0-9]+$/ {
+    t = strftime("%Y-%m-%d %H:%M:%S", $2)
+    if ($3 == "W") {
+        w++
+        print "BGP4MP", t, "W", q($4), q($5), q($6), "", "", "", "", "", "", "", "", "normal"
+        next
+    }
+    a++
+    if ($7 != "") orig++
+    if ($11 != "") med++
+    if ($12 != "") comm++
+    print "BGP4MP", t, "A", q($4), q($5), q($6), q($7), q($8), q($9), q($10),
+          q($11), q($12), q($13), q($14), "normal"
+}
+END { printf "#counts %d %d %d %d %d\n", a, w, orig, med, comm }
+'''
+AWK_COUNTS_PREFIX = b"#counts "
+
+# CSV columns; parsed records are tuples in this order
+FIELDS = ['MRT_Type', 'Time', 'Entry_Type', 'Peer_IP', 'Peer_AS',
+          'Prefix', 'AS_Path', 'Origin', 'Next_Hop', 'Local_Pref',
+          'MED', 'Community', 'Atomic_Aggregate', 'Aggregator', 'Label']
+
+# Marks the end of a pipeline queue
+_DONE = object()
 
 # Time range - November 16, 2025 00:05 to November 17, 2025 00:00
 START_FILE = "updates.20251117.0005.gz"
 END_FILE = "updates.20251118.0000.gz"
 
+def _find_awk():
+    """Return an awk binary that supports strftime(), or None."""
+    for name in ("gawk", "mawk", "awk"):
+        path = shutil.which(name)
+        if not path:
+            continue
+        try:
+            result = subprocess.run([path, 'BEGIN { print strftime("%Y", 0) }'],
+                                    capture_output=True, text=True, timeout=5,
+                                    env={**os.environ, 'TZ': 'UTC'})
+        except (OSError, subprocess.SubprocessError):
+            continue
+        if result.stdout.strip() == "1970":
+            return path
+    return None
+
+# Convert with bgpdump | awk when possible, otherwise parse lines in Python
+AWK = _find_awk()
+
+# Parser used for every file (pybgpkit takes priority when installed)
+if HAS_BGPKIT:
+    PARSER = "pybgpkit"
+elif AWK:
+    PARSER = "bgpdump | awk"
+else:
+    PARSER = "bgpdump"
+
 def create_directories():
     """Create necessary directories."""
     Path(OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
-    Path(TEMP_DIR).mkdir(parents=True, exist_ok=True)
 
-def download_file(url, local_path):
-    """Download a file from URL."""
+def create_session():
+    """Create an HTTP session whose connection pool covers all download workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=DOWNLOAD_WORKERS * 2,
+                          pool_maxsize=DOWNLOAD_WORKERS * 2)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def load_manifest():
+    """Load the download manifest (filename -> remote file info)."""
     try:
-        print(f"Downloading {url}...")
-        with urlopen(url) as response:
-            with open(local_path, 'wb') as out_file:
-                out_file.write(response.read())
-        print(f"✓ Downloaded: {local_path}")
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest):
+    """Atomically write the download manifest."""
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def is_complete(local_path, info):
+    """Check whether local_path exists with the size recorded in info."""
+    return (bool(info) and info.get('size') is not None
+            and os.path.exists(local_path)
+            and os.path.getsize(local_path) == info['size'])
+
+def fetch_remote_info(session, url):
+    """
+    Send a HEAD request for url.
+
+    Returns a dict with size, etag and last_modified, or None if the file
+    does not exist on the server.
+    """
+    response = session.head(url, allow_redirects=True, timeout=10)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    size = response.headers.get('Content-Length')
+    return {
+        'size': int(size) if size is not None else None,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+
+def download_file(session, url, local_path, info=None):
+    """
+    Download a file from URL, streaming the body straight to disk.
+
+    If info (from fetch_remote_info) is given and a shorter local copy exists,
+    the download resumes from its end with a Range request; If-Range makes the
+    server send the whole file instead if it has changed in the meantime.
+    """
+    headers = {}
+    if info and info.get('size') and os.path.exists(local_path):
+        offset = os.path.getsize(local_path)
+        validator = info.get('etag') or info.get('last_modified')
+        if 0 < offset < info['size'] and validator:
+            headers = {'Range': f'bytes={offset}-', 'If-Range': validator}
+
+    try:
+        with session.get(url, stream=True, timeout=60, headers=headers) as response:
+            response.raise_for_status()
+            resumed = response.status_code == 206
+            with open(local_path, 'ab' if resumed else 'wb') as out_file:
+                shutil.copyfileobj(response.raw, out_file, length=DOWNLOAD_CHUNK)
+
+        if info and info.get('size') is not None:
+            size = os.path.getsize(local_path)
+            if size != info['size']:
+                print(f"✗ Incomplete download {url}: {size:,} of {info['size']:,} bytes")
+                return False
+
+        print(f"✓ {'Resumed' if resumed else 'Downloaded'}: {local_path}")
         return True
     except Exception as e:
         print(f"✗ Error downloading {url}: {e}")
         return False
 
-def decompress_gz(gz_file, output_file):
-    """Decompress gzip file."""
+def start_bgpdump(mrt_file, stderr):
+    """
+    Start bgpdump -m on a gzipped MRT file without a decompressed copy on disk.
+
+    Returns (bgpdump, pigz) processes; pigz is None when bgpdump inflates
+    the file itself.
+    """
+    if not PIGZ:
+        dump = subprocess.Popen(['bgpdump', '-m', mrt_file], stdout=subprocess.PIPE,
+                                stderr=stderr, bufsize=BGPDUMP_BUFSIZE)
+        return dump, None
+
+    inflate = subprocess.Popen([PIGZ, '-dc', '-p', str(PIGZ_THREADS), mrt_file],
+                               stdout=subprocess.PIPE, stderr=stderr)
     try:
-        with gzip.open(gz_file, 'rb') as f_in:
-            with open(output_file, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
-        return True
-    except Exception as e:
-        print(f"✗ Error decompressing {gz_file}: {e}")
-        return False
+        dump = subprocess.Popen(['bgpdump', '-m', '-'], stdin=inflate.stdout,
+                                stdout=subprocess.PIPE, stderr=stderr,
+                                bufsize=BGPDUMP_BUFSIZE)
+    except Exception:
+        inflate.kill()
+        inflate.wait()
+        raise
+    finally:
+        # Only bgpdump should hold the read end of the pipe
+        inflate.stdout.close()
+    return dump, inflate
+
+def check_exit_status(err, *procs):
+    """Raise RuntimeError if a process of a bgpdump pipeline failed (err holds their stderr)."""
+    failed = [f"{os.path.basename(proc.args[0])} exited with status {proc.returncode}"
+              for proc in procs if proc is not None and proc.returncode != 0]
+    if failed:
+        err.seek(0)
+        message = err.read().decode(errors='replace').strip()[-500:]
+        raise RuntimeError('; '.join(failed) + (f": {message}" if message else ''))
+
+@lru_cache(maxsize=8192)
+def _fmt_ts(timestamp):
+    """Format a Unix timestamp as a UTC string (records cluster on the same second)."""
+    return datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
 
 def parse_bgpdump_line(line):
     """
@@ -63,130 +258,400 @@ def parse_bgpdump_line(line):
     Format for withdrawals:
     BGP4MP|timestamp|W|peer_ip|peer_as|prefix
 
-    Returns a record dictionary or None if line is invalid.
+    Returns a record tuple in FIELDS order or None if line is invalid.
     """
-    line = line.strip()
-    if not line:
+    # Cheap prefix test rejects other record types before splitting
+    if not line.startswith('BGP4MP|'):
         return None
 
-    parts = line.split('|')
+    line = line.strip()
+
+    # Split at most 14 times; anything after the aggregator field is ignored
+    parts = line.split('|', 14)
 
     # Minimum fields required
     if len(parts) < 6:
         return None
 
-    try:
-        msg_type = parts[0]  # Should be 'BGP4MP'
-        if msg_type != 'BGP4MP':
-            return None
+    # Withdrawals and short announcements: pad missing attributes with ''
+    if len(parts) < 15:
+        parts.extend([''] * (15 - len(parts)))
 
-        timestamp = int(parts[1])
-        dt = datetime.utcfromtimestamp(timestamp)
-        date_time = dt.strftime('%Y-%m-%d %H:%M:%S')
+    (_, timestamp, update_type, peer_ip, peer_as, prefix, as_path, origin,
+     next_hop, local_pref, med, community, atomic_agg, aggregator, _) = parts
 
-        update_type = parts[2]  # 'A' for Announce, 'W' for Withdraw
-        peer_ip = parts[3]
-        peer_as = parts[4]
-        prefix = parts[5]
+    try:
+        date_time = _fmt_ts(int(timestamp))
 
         # For withdrawals, we only have these fields
         if update_type == 'W':
-            return {
-                'MRT_Type': 'BGP4MP',
-                'Time': date_time,
-                'Entry_Type': 'W',
-                'Peer_IP': peer_ip,
-                'Peer_AS': peer_as,
-                'Prefix': prefix,
-                'AS_Path': '',
-                'Origin': '',
-                'Next_Hop': '',
-                'Local_Pref': '',
-                'MED': '',
-                'Community': '',
-                'Atomic_Aggregate': '',
-                'Aggregator': '',
-                'Label': 'normal'
-            }
-
-        # For announcements, parse additional fields
-        as_path = parts[6] if len(parts) > 6 else ''
-        origin = parts[7] if len(parts) > 7 else ''
-        next_hop = parts[8] if len(parts) > 8 else ''
-        local_pref = parts[9] if len(parts) > 9 else ''
-        med = parts[10] if len(parts) > 10 else ''
-        community = parts[11] if len(parts) > 11 else ''
-        atomic_agg = parts[12] if len(parts) > 12 else ''
-        aggregator = parts[13] if len(parts) > 13 else ''
-
-
-        return {
-            'MRT_Type': 'BGP4MP',
-            'Time': date_time,
-            'Entry_Type': 'A',
-            'Peer_IP': peer_ip,
-            'Peer_AS': peer_as,
-            'Prefix': prefix,
-            'AS_Path': as_path,
-            'Origin': origin,
-            'Next_Hop': next_hop,
-            'Local_Pref': local_pref,
-            'MED': med,
-            'Community': community,
-            'Atomic_Aggregate': atomic_agg,
-            'Aggregator': aggregator,
-            'Label': 'normal'
-        }
-
-    except (ValueError, IndexError) as e:
+            return ('BGP4MP', date_time, 'W', peer_ip, peer_as, prefix,
+                    '', '', '', '', '', '', '', '', 'normal')
+
+        return ('BGP4MP', date_time, 'A', peer_ip, peer_as, prefix,
+                as_path, origin, next_hop, local_pref, med, community,
+                atomic_agg, aggregator, 'normal')
+
+    except ValueError:
         return None
 
 def parse_mrt_file_with_bgpdump(mrt_file, debug=False):
     """
     Parse MRT file using bgpdump and extract all BGP attributes.
+
+    bgpdump's stdout is consumed line by line, so records are yielded as
+    they are produced instead of buffering the whole dump in memory.
+    Raises RuntimeError once the output is exhausted if pigz or bgpdump failed.
     """
-    records = []
+    count = 0
+    lines = 0
 
     try:
-        # Run bgpdump with -m flag for machine-readable output
-        result = subprocess.run(
-            ['bgpdump', '-m', mrt_file],
-            capture_output=True,
-            text=True,
-            check=False
-        )
-
-        if result.returncode != 0:
-            if debug:
-                print(f"    [DEBUG] bgpdump error: {result.stderr}")
-            return []
-
-        # Parse each line
-        lines = result.stdout.strip().split('\n')
-
-        for line in lines:
-            record = parse_bgpdump_line(line)
-            if record:
-                records.append(record)
-
-        if debug and records:
-            print(f"    [DEBUG] Parsed {len(records)} records from {len(lines)} lines")
-            print(f"    [DEBUG] Sample record: {records[0]}")
+        with tempfile.TemporaryFile() as err:
+            # Run bgpdump with -m flag for machine-readable output
+            proc, inflate = start_bgpdump(mrt_file, err)
+
+            with proc:
+                for raw in proc.stdout:
+                    lines += 1
+                    if not raw.startswith(b'BGP4MP|'):
+                        continue
+                    record = parse_bgpdump_line(raw.decode('ascii', 'replace'))
+                    if record:
+                        if debug and count == 0:
+                            print(f"    [DEBUG] Sample record: {record}")
+                        count += 1
+                        yield record
+            if inflate:
+                inflate.wait()
+
+            # A truncated or corrupt .gz must fail the file, not pass as partial rows
+            check_exit_status(err, proc, inflate)
+
+        if debug and count:
+            print(f"    [DEBUG] Parsed {count} records from {lines} lines")
 
     except FileNotFoundError:
         print("✗ bgpdump not found. Install with: apt-get install bgpdump")
-        return []
-    except Exception as e:
+        raise
+
+def parse_mrt_file_with_bgpkit(mrt_file, debug=False):
+    """
+    Parse MRT file with pybgpkit and yield record tuples in FIELDS order.
+
+    Columns are formatted the way bgpdump -m prints them, including 0 for
+    absent LOCAL_PREF/MED, so the CSV does not depend on the parser used.
+    """
+    count = 0
+
+    for elem in bgpkit.Parser(url=str(mrt_file)):
+        date_time = _fmt_ts(int(elem.timestamp))
+        peer_as = str(elem.peer_asn) if elem.peer_asn else ''
+
+        if elem.elem_type == 'W':
+            record = ('BGP4MP', date_time, 'W', elem.peer_ip or '', peer_as,
+                      elem.prefix or '', '', '', '', '', '', '', '', '', 'normal')
+        else:
+            community = ' '.join(str(c) for c in elem.communities) if elem.communities else ''
+            aggregator = ''
+            aggr_asn = getattr(elem, 'aggr_asn', None)
+            aggr_ip = getattr(elem, 'aggr_ip', None)
+            if aggr_asn:
+                aggregator = f"{aggr_asn} {aggr_ip}" if aggr_ip else str(aggr_asn)
+
+            record = ('BGP4MP', date_time, 'A', elem.peer_ip or '', peer_as,
+                      elem.prefix or '', elem.as_path or '', elem.origin or '',
+                      elem.next_hop or '',
+                      str(elem.local_pref) if elem.local_pref is not None else '0',
+                      str(elem.med) if elem.med is not None else '0',
+                      community, 'AG' if elem.atomic else 'NAG', aggregator, 'normal')
+
+        if debug and count == 0:
+            print(f"    [DEBUG] Sample record: {record}")
+        count += 1
+        yield record
+
+    if debug:
+        print(f"    [DEBUG] Parsed {count} records with bgpkit")
+
+def convert_mrt_file_with_awk(mrt_file, emit, debug=False):
+    """
+    Convert MRT file to CSV text by piping bgpdump through awk.
+
+    The field reformatting runs in awk rather than in Python. emit is called
+    with chunks of complete CSV lines; returns the per-file statistics.
+    Raises RuntimeError if pigz, bgpdump or awk failed.
+    """
+    stats = new_stats()
+
+    try:
+        with tempfile.TemporaryFile() as err:
+            dump, inflate = start_bgpdump(mrt_file, err)
+            conv = subprocess.Popen([AWK, AWK_PROGRAM], stdin=dump.stdout,
+                                    stdout=subprocess.PIPE, stderr=err,
+                                    env={**os.environ, 'TZ': 'UTC'})
+            # Let bgpdump get SIGPIPE if awk exits early
+            dump.stdout.close()
+
+            counts = None
+            with conv:
+                while True:
+                    lines = conv.stdout.readlines(BGPDUMP_BUFSIZE)
+                    if not lines:
+                        break
+                    # The counts line is the last line awk prints
+                    if lines[-1].startswith(AWK_COUNTS_PREFIX):
+                        counts = lines.pop().split()[1:]
+                    if lines:
+                        emit(b''.join(lines).decode('ascii', 'replace'))
+            dump.wait()
+            if inflate:
+                inflate.wait()
+            check_exit_status(err, dump, inflate, conv)
+
+        if counts is None or len(counts) != 5:
+            raise RuntimeError("awk did not report record counts")
+        (stats['announcements'], stats['withdrawals'], stats['with_origin'],
+         stats['with_med'], stats['with_community']) = map(int, counts)
+        stats['records'] = stats['announcements'] + stats['withdrawals']
+
         if debug:
-            print(f"✗ Error parsing MRT file: {e}")
-        return []
+            print(f"    [DEBUG] Converted {stats['records']} records with {AWK}")
+
+    except FileNotFoundError:
+        print("✗ bgpdump not found. Install with: apt-get install bgpdump")
+        raise
 
-    return records
+    return stats
+
+def new_stats():
+    """Return zeroed per-file record counters."""
+    return {'records': 0, 'announcements': 0, 'withdrawals': 0,
+            'with_origin': 0, 'with_med': 0, 'with_community': 0}
+
+def count_records(records, stats):
+    """Add a batch of record tuples (FIELDS order) to stats."""
+    for record in records:
+        if record[2] == 'A':
+            stats['announcements'] += 1
+        else:
+            stats['withdrawals'] += 1
+        # Origin AS is the last hop of a non-empty AS_Path
+        if record[6]:
+            stats['with_origin'] += 1
+        if record[10]:
+            stats['with_med'] += 1
+        if record[11]:
+            stats['with_community'] += 1
+    stats['records'] += len(records)
+
+@contextmanager
+def open_csv_output(path):
+    """Open the output CSV as a text stream, gzip-compressed if COMPRESS_CSV is set."""
+    if not COMPRESS_CSV:
+        with open(path, 'w', newline='', encoding='utf-8', buffering=CSV_BUFSIZE) as csvfile:
+            yield csvfile
+        return
+
+    if not PIGZ:
+        with gzip.open(path, 'wt', newline='', encoding='utf-8') as csvfile:
+            yield csvfile
+        return
+
+    # pigz compresses on PIGZ_THREADS cores while rows are still being produced
+    with open(path, 'wb') as out:
+        proc = subprocess.Popen([PIGZ, '-c', '-p', str(PIGZ_THREADS)],
+                                stdin=subprocess.PIPE, stdout=out, bufsize=CSV_BUFSIZE)
+    csvfile = io.TextIOWrapper(proc.stdin, encoding='utf-8', newline='')
+    try:
+        yield csvfile
+    finally:
+        csvfile.close()
+        proc.wait()
+    if proc.returncode != 0:
+        raise RuntimeError(f"pigz exited with status {proc.returncode}")
+
+def _quote_row(record):
+    """Format one record with csv.writer's quoting (slow path of format_rows)."""
+    buf = io.StringIO()
+    csv.writer(buf).writerow(record)
+    return buf.getvalue()[:-2]  # drop the '\r\n' terminator
+
+def format_rows(records):
+    """
+    Format record tuples (of str) as CSV text, identical to csv.writer output.
+
+    Fields are joined directly; only rows that contain a delimiter, quote or
+    line break are passed through the csv module's quoting.
+    """
+    lines = []
+    for record in records:
+        line = ','.join(record)
+        if (line.count(',') != len(record) - 1 or '"' in line
+                or '\r' in line or '\n' in line):
+            line = _quote_row(record)
+        lines.append(line)
+    if not lines:
+        return ''
+    return '\r\n'.join(lines) + '\r\n'
+
+class _Cancelled(Exception):
+    """Raised inside a stage when the pipeline has been cancelled."""
+
+def _run_stage(func, in_q, out_q, cancel):
+    """
+    Apply func to items from in_q until _DONE, forwarding non-None results to out_q.
+
+    Once cancel is set, items are still taken off in_q (so upstream stages
+    never block) but no longer processed.
+    """
+    while True:
+        item = in_q.get()
+        if item is _DONE:
+            return
+        if cancel.is_set():
+            continue
+        try:
+            result = func(item)
+        except Exception as e:
+            print(f"✗ Error processing {item}: {e}")
+            continue
+        if result is not None:
+            out_q.put(result)
+
+def run_pipeline(filenames, result_q, cancel, ready):
+    """
+    Run download -> parse as concurrent stages.
+
+    Each stage has its own worker pool and hands work to the next through a
+    bounded queue, so downloads overlap with parsing (which streams the .gz
+    and never writes it out inflated). Each file's CSV rows are spooled to a
+    temporary file, and one (filename, spool, stats) tuple per file is put on
+    result_q, followed by _DONE; spool and stats are None if the file could
+    not be downloaded or parsed. filenames[i] is only parsed once the
+    ready[i] event is set, which lets the consumer bound how many spools
+    exist at once. Setting the cancel event stops all work (set every ready
+    event too); _DONE is still put once the workers have exited.
+    """
+    order = {filename: i for i, filename in enumerate(filenames)}
+    dl_q = queue.Queue()
+    parse_q = queue.Queue(maxsize=QUEUE_SIZE)
+    first_file = filenames[0] if filenames else None
+    manifest = load_manifest()
+    manifest_lock = threading.Lock()
+
+    def admit(filename, local_path):
+        """Wait until filename may be parsed; returns local_path, or None if cancelled."""
+        ready[order[filename]].wait()
+        return None if cancel.is_set() else local_path
+
+    def download(filename):
+        url = f"{BASE_URL}/{filename}"
+        local_path = os.path.join(OUTPUT_DIR, filename)
+
+        # HEAD first: skips files missing on the server and finds partial local copies
+        try:
+            info = fetch_remote_info(session, url)
+        except Exception as e:
+            print(f"✗ Error checking {url}: {e}")
+            # Without a remote size, never overwrite a local copy we cannot verify
+            if os.path.exists(local_path):
+                print(f"Already exists (unverified): {filename}")
+                return admit(filename, local_path)
+            info = {}
+        if info is None:
+            print(f"✗ Not on server: {filename}")
+            result_q.put((filename, None, None))
+            return None
+
+        if is_complete(local_path, info):
+            print(f"Already exists: {filename}")
+        elif not download_file(session, url, local_path, info):
+            print(f"  (Skipping {filename})")
+            result_q.put((filename, None, None))
+            return None
+
+        if info:
+            with manifest_lock:
+                manifest[filename] = info
+        return admit(filename, local_path)
+
+    def parse(mrt_file):
+        filename = os.path.basename(mrt_file)
+        debug = (filename == first_file)
+        # Rows are spooled so the writer can emit files in order
+        spool = tempfile.TemporaryFile('w+', newline='', encoding='utf-8', dir=RIPE_DIR)
+
+        def write(text):
+            if cancel.is_set():
+                raise _Cancelled()
+            spool.write(text)
+
+        try:
+            if AWK and not HAS_BGPKIT:
+                stats = convert_mrt_file_with_awk(mrt_file, write, debug=debug)
+            else:
+                parser = parse_mrt_file_with_bgpkit if HAS_BGPKIT else parse_mrt_file_with_bgpdump
+                stats = new_stats()
+                batch = []
+                for record in parser(mrt_file, debug=debug):
+                    batch.append(record)
+                    if len(batch) >= RECORD_BATCH:
+                        count_records(batch, stats)
+                        write(format_rows(batch))
+                        batch = []
+                count_records(batch, stats)
+                write(format_rows(batch))
+        except _Cancelled:
+            spool.close()
+            return filename, None, None
+        except Exception as e:
+            spool.close()
+            print(f"✗ Error parsing {filename}: {e}")
+            return filename, None, None
+        return filename, spool, stats
+
+    session = create_session()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as dl_pool, \
+             concurrent.futures.ThreadPoolExecutor(max_workers=PARSE_WORKERS) as parse_pool:
+            dl_workers = [dl_pool.submit(_run_stage, download, dl_q, parse_q, cancel)
+                          for _ in range(DOWNLOAD_WORKERS)]
+            parse_workers = [parse_pool.submit(_run_stage, parse, parse_q, result_q, cancel)
+                             for _ in range(PARSE_WORKERS)]
+
+            # Queue files that are missing or unverified first so downloads start
+            # right away, then feed complete local files straight to parsing
+            existing = []
+            for filename in filenames:
+                local_path = os.path.join(OUTPUT_DIR, filename)
+                if is_complete(local_path, manifest.get(filename)):
+                    print(f"Already exists: {filename}")
+                    existing.append((filename, local_path))
+                else:
+                    dl_q.put(filename)
+            for _ in dl_workers:
+                dl_q.put(_DONE)
+            for filename, local_path in existing:
+                if admit(filename, local_path):
+                    parse_q.put(local_path)
+
+            concurrent.futures.wait(dl_workers)
+            for _ in parse_workers:
+                parse_q.put(_DONE)
+            concurrent.futures.wait(parse_workers)
+    finally:
+        session.close()
+        try:
+            save_manifest(manifest)
+        except OSError as e:
+            print(f"Warning: could not save {MANIFEST_PATH}: {e}")
+        result_q.put(_DONE)
 
 def collect_and_process_updates():
     """Main function to collect and process update packets."""
     print("=" * 70)
-    print("RIPE RRC04 Update Packet Collector (with bgpdump)")
+    print(f"RIPE RRC04 Update Packet Collector (with {PARSER})")
     print("=" * 70)
 
     create_directories()
@@ -208,97 +673,111 @@ def collect_and_process_updates():
     print(f"Time range: {start_time} to {end_time}")
     print()
 
-    # Download files
-    downloaded_files = []
-    for i, filename in enumerate(files_to_download, 1):
-        url = f"{BASE_URL}/{filename}"
-        local_path = os.path.join(OUTPUT_DIR, filename)
-
-        # Skip if already downloaded
-        if os.path.exists(local_path):
-            print(f"[{i}/{len(files_to_download)}] Already exists: {filename}")
-            downloaded_files.append(local_path)
-            continue
-
-        print(f"[{i}/{len(files_to_download)}] ", end="")
-        if download_file(url, local_path):
-            downloaded_files.append(local_path)
-        else:
-            print(f"  (Skipping {filename})")
-
-    print(f"\nTotal files available: {len(downloaded_files)}")
-
-    # Decompress and convert
-    print("\n" + "=" * 70)
-    print("Decompressing and parsing MRT files...")
+    # Download and parse concurrently
     print("=" * 70)
-
-    all_records = []
-
-    for i, gz_file in enumerate(downloaded_files, 1):
-        mrt_file = os.path.join(TEMP_DIR, os.path.basename(gz_file).replace('.gz', ''))
-
-        print(f"[{i}/{len(downloaded_files)}] Processing {os.path.basename(gz_file)}...", end=" ")
-
-        # Decompress
-        if not decompress_gz(gz_file, mrt_file):
-            print("Failed")
-            continue
-
-        # Parse with bgpdump (enable debug for first file)
-        records = parse_mrt_file_with_bgpdump(mrt_file, debug=(i == 1))
-
-        if records:
-            print(f"✓ {len(records)} records")
-            all_records.extend(records)
-        else:
-            print(f"✓ 0 records")
-
-        # Clean up temp file
-        try:
-            os.remove(mrt_file)
-        except:
-            pass
-
-    # Write final CSV
-    print("\n" + "=" * 70)
-    print(f"Writing final CSV: {CSV_OUTPUT}")
+    print("Downloading and parsing MRT files...")
     print("=" * 70)
 
-    if all_records:
-        fieldnames = ['MRT_Type', 'Time', 'Entry_Type', 'Peer_IP', 'Peer_AS',
-                     'Prefix', 'AS_Path', 'Origin', 'Next_Hop', 'Local_Pref',
-                     'MED', 'Community', 'Atomic_Aggregate', 'Aggregator', 'Label']
-        try:
-            with open(CSV_OUTPUT, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames, restval='')
-                writer.writeheader()
-                writer.writerows(all_records)
-
+    totals = new_stats()
+    sample_a = None
+    processed = 0
+    rows_written = False
+    try:
+        with open_csv_output(CSV_OUTPUT) as csvfile:
+            csvfile.write(format_rows([FIELDS]))
+
+            result_q = queue.Queue(maxsize=QUEUE_SIZE)
+            cancel = threading.Event()
+            # Parsing may run at most PARSE_AHEAD files ahead of the writer
+            ready = [threading.Event() for _ in files_to_download]
+            for event in ready[:PARSE_AHEAD]:
+                event.set()
+            producer = threading.Thread(target=run_pipeline,
+                                        args=(files_to_download, result_q, cancel, ready),
+                                        daemon=True)
+            producer.start()
+
+            def write_file(index, filename, spool, stats):
+                """Append one file's spooled rows to the CSV."""
+                nonlocal sample_a, processed, rows_written
+                progress = f"[{index + 1}/{len(files_to_download)}] {filename}"
+                if spool is None:
+                    print(f"{progress}: ✗ Failed")
+                    return
+                with spool:
+                    if spool.seek(0, io.SEEK_END):
+                        rows_written = True
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, csvfile, CSV_BUFSIZE)
+                    if sample_a is None:
+                        spool.seek(0)
+                        sample_a = next((r for r in csv.reader(spool) if r[2] == 'A'), None)
+                for key, value in stats.items():
+                    totals[key] += value
+                processed += 1
+                print(f"{progress}: ✓ {stats['records']} records")
+
+            # Files finish in any order but are written in files_to_download order
+            order = {filename: i for i, filename in enumerate(files_to_download)}
+            finished = {}
+            next_index = 0
+            try:
+                while True:
+                    item = result_q.get()
+                    if item is _DONE:
+                        break
+                    finished[order[item[0]]] = item
+                    while next_index in finished:
+                        write_file(next_index, *finished.pop(next_index))
+                        if next_index + PARSE_AHEAD < len(ready):
+                            ready[next_index + PARSE_AHEAD].set()
+                        next_index += 1
+
+                # A file lost to an unexpected error never arrives; keep order for the rest
+                for index in sorted(finished):
+                    write_file(index, *finished.pop(index))
+            except BaseException:
+                # Stop the stages and drain result_q until _DONE so their
+                # (non-daemon) worker threads can finish and the process can exit
+                cancel.set()
+                for event in ready:
+                    event.set()
+                pending = list(finished.values())
+                while True:
+                    item = result_q.get()
+                    if item is _DONE:
+                        break
+                    pending.append(item)
+                for _, spool, _ in pending:
+                    if spool is not None:
+                        spool.close()
+                raise
+
+            producer.join()
+        print(f"\nTotal files processed: {processed}/{len(files_to_download)}")
+
+        print("\n" + "=" * 70)
+        print(f"Final CSV: {CSV_OUTPUT}")
+        print("=" * 70)
+
+        if rows_written:
             print(f"✓ CSV file created: {CSV_OUTPUT}")
-            print(f"✓ Total records: {len(all_records):,}")
+            print(f"✓ Total records: {totals['records']:,}")
 
             # Show statistics
-            announcements = sum(1 for r in all_records if r['Entry_Type'] == 'A')
-            withdrawals = sum(1 for r in all_records if r['Entry_Type'] == 'W')
-            with_med = sum(1 for r in all_records if r.get('MED'))
-            with_community = sum(1 for r in all_records if r.get('Community'))
-
             print(f"\nStatistics:")
-            print(f"  Announcements: {announcements:,}")
-            print(f"  Withdrawals: {withdrawals:,}")
-            print(f"  Records with Origin AS: {with_origin:,}")
-            print(f"  Records with MED: {with_med:,}")
-            print(f"  Records with Communities: {with_community:,}")
+            print(f"  Announcements: {totals['announcements']:,}")
+            print(f"  Withdrawals: {totals['withdrawals']:,}")
+            print(f"  Records with Origin AS: {totals['with_origin']:,}")
+            print(f"  Records with MED: {totals['with_med']:,}")
+            print(f"  Records with Communities: {totals['with_community']:,}")
 
             # Show sample records
-            if announcements > 0:
+            if sample_a:
                 print(f"\nSample announcement:")
-                sample_a = next((r for r in all_records if r['Entry_Type'] == 'A'), None)
-                if sample_a:
-                    for key, value in sample_a.items():
-                        if value:
-                            print(f"  {key}: {value}")
+                for key, value in zip(FIELDS, sample_a):
+                    if value:
+                        print(f"  {key}: {value}")
 
             # Verify file was written
             if os.path.exists(CSV_OUTPUT):
@@ -306,30 +785,24 @@ def collect_and_process_updates():
                 print(f"\n✓ File size: {file_size:,} bytes")
             else:
                 print("✗ Error: CSV file was not created")
-        except Exception as e:
-            print(f"✗ Error writing CSV: {e}")
-            import traceback
-            traceback.print_exc()
-    else:
-        print("✗ No records generated")
-        print("\nPossible issues:")
-        print("  - bgpdump not installed (install with: apt-get install bgpdump)")
-        print("  - MRT files are empty or corrupted")
-        print("  - No BGP UPDATE messages in the time range")
-
-    # Cleanup - only remove temp files, keep MRT files and CSV
-    print("\nCleaning up temporary files...")
-    try:
-        shutil.rmtree(TEMP_DIR)
-        print("✓ Temporary files cleaned up")
-        print(f"\n" + "=" * 70)
-        print(f"Summary:")
-        print(f"=" * 70)
-        print(f"MRT files saved in: {OUTPUT_DIR}")
-        print(f"CSV file saved in: {CSV_OUTPUT}")
-        print(f"All files located in: {os.path.abspath(RIPE_DIR)}")
+        else:
+            os.remove(CSV_OUTPUT)
+            print("✗ No records generated")
+            print("\nPossible issues:")
+            print("  - bgpdump not installed (install with: apt-get install bgpdump)")
+            print("  - MRT files are empty or corrupted")
+            print("  - No BGP UPDATE messages in the time range")
     except Exception as e:
-        print(f"Warning: {e}")
+        print(f"✗ Error writing CSV: {e}")
+        import traceback
+        traceback.print_exc()
+
+    print(f"\n" + "=" * 70)
+    print(f"Summary:")
+    print(f"=" * 70)
+    print(f"MRT files saved in: {OUTPUT_DIR}")
+    print(f"CSV file saved in: {CSV_OUTPUT}")
+    print(f"All files located in: {os.path.abspath(RIPE_DIR)}")
 
 if __name__ == "__main__":
     collect_and_process_updates()